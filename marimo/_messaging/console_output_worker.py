@@ -5,27 +5,36 @@ import time
 from dataclasses import dataclass
 from typing import TYPE_CHECKING, Literal
 
+from marimo import _loggers
 from marimo._messaging.cell_output import CellChannel, CellOutput
 from marimo._messaging.mimetypes import ConsoleMimeType
 from marimo._types.ids import CellId_t
 
 if TYPE_CHECKING:
     from collections import deque
-    from threading import Condition
+    from threading import Event
     from typing import Optional
 
     from marimo._messaging.types import Stream
 
+LOGGER = _loggers.marimo_logger()
+
 StreamT = Literal[CellChannel.STDERR, CellChannel.STDOUT, CellChannel.STDIN]
 
 # Flush console outputs every 10ms
 TIMEOUT_S = 0.01
 
 
+# __slots__ is spelled out because dataclass(slots=True) needs Python 3.10.
+# One is created per console write; without a per-instance __dict__ they
+# are cheaper to allocate. Instances are mutable, so that the writer can
+# merge outputs in place.
 @dataclass
 class ConsoleMsg:
+    __slots__ = ("stream", "cell_id", "data", "mimetype")
+
     stream: StreamT
-    cell_id: CellId_t
+    cell_id: Optional[CellId_t]
     data: str
     mimetype: ConsoleMimeType
 
@@ -58,6 +67,14 @@ def _add_output_to_buffer(
     outputs_buffered_per_cell: dict[CellId_t, list[ConsoleMsg]],
 ) -> None:
     cell_id = console_output.cell_id
+    if cell_id is None:
+        # e.g. output forwarded from a redirected fd after its cell
+        # finished
+        LOGGER.debug(
+            "Discarding %s output written outside of a cell",
+            console_output.stream,
+        )
+        return
     buffer = (
         outputs_buffered_per_cell[cell_id]
         if cell_id in outputs_buffered_per_cell
@@ -74,15 +91,19 @@ def _add_output_to_buffer(
 def buffered_writer(
     msg_queue: deque[ConsoleMsg | None],
     stream: Stream,
-    cv: Condition,
+    event: Event,
 ) -> None:
     """
     Writes standard out and standard error to frontend in batches
 
-    Buffers console messages, writing them out in batches. A condition
-    variable is used to synchronize access to `msg_queue`, and to obtain
-    notifications when messages have been added. (A deque + condition variable
-    was noticeably faster than the builtin queue.Queue in testing.)
+    Buffers console messages, writing them out in batches. Producers append
+    to `msg_queue` (deque appends and pops are atomic) and then set `event`
+    if it isn't set already; the writer clears the event before draining the
+    queue, so a message appended while draining is either drained now or
+    wakes the next wait. (A deque + condition variable was noticeably faster
+    than the builtin queue.Queue in testing; signaling with an event that
+    stays set until the writer drains lets producers skip the lock while
+    output is arriving faster than it's drained.)
 
     A `None` passed to `msg_queue` signals the writer should terminate.
     """
@@ -94,26 +115,26 @@ def buffered_writer(
 
     outputs_buffered_per_cell: dict[CellId_t, list[ConsoleMsg]] = {}
     while True:
-        with cv:
-            # We wait for messages until the timer (if any) expires
-            while timer is None or timer > 0:
-                time_started_waiting = time.time()
-                # if the timer is set or if the message queue is empty, wait;
-                # otherwise, no timer is set but we received a message, so
-                # process it
-                if timer is not None or not msg_queue:
-                    cv.wait(timeout=timer)
-                while msg_queue:
-                    msg = msg_queue.popleft()
-                    if msg is None:
-                        return
-                    _add_output_to_buffer(msg, outputs_buffered_per_cell)
-                if outputs_buffered_per_cell and timer is None:
-                    # start the timeout timer
-                    timer = TIMEOUT_S
-                elif timer is not None:
-                    time_waited = time.time() - time_started_waiting
-                    timer -= time_waited
+        # We wait for messages until the timer (if any) expires
+        while timer is None or timer > 0:
+            time_started_waiting = time.time()
+            # if the timer is set or if the message queue is empty, wait;
+            # otherwise, no timer is set but we received a message, so
+            # process it
+            if timer is not None or not msg_queue:
+                event.wait(timeout=timer)
+            event.clear()
+            while msg_queue:
+                msg = msg_queue.popleft()
+                if msg is None:
+                    return
+                _add_output_to_buffer(msg, outputs_buffered_per_cell)
+            if outputs_buffered_per_cell and timer is None:
+                # start the timeout timer
+                timer = TIMEOUT_S
+            elif timer is not None:
+                time_waited = time.time() - time_started_waiting
+                timer -= time_waited
 
         # the timer has expired: flush the outputs
         for cell_id, buffer in outputs_buffered_per_cell.items():
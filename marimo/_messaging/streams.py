@@ -1,15 +1,19 @@
 # Copyright 2024 Marimo. All rights reserved.
 from __future__ import annotations
 
+import codecs
 import contextlib
 import io
 import os
+import pickle
+import select
 import sys
 import threading
 from collections import deque
 from typing import (
     TYPE_CHECKING,
     Any,
+    Final,
     Optional,
     Protocol,
 )
@@ -30,10 +34,15 @@ from marimo._types.ids import CellId_t
 
 if TYPE_CHECKING:
     import queue
-    from collections.abc import Iterable, Iterator
+    from collections.abc import Callable, Iterable, Iterator
 
 LOGGER = _loggers.marimo_logger()
 
+# Bound once to spare the enum attribute lookups on every console write
+_STDOUT: Final = CellChannel.STDOUT
+_STDERR: Final = CellChannel.STDERR
+_STDIN: Final = CellChannel.STDIN
+
 
 # Byte limits on outputs exist for two reasons
 #
@@ -64,13 +73,84 @@ def output_max_bytes() -> int:
         return 5_000_000
 
 
-def std_stream_max_bytes() -> int:
+_DEFAULT_STD_STREAM_MAX_BYTES = 1_000_000
+
+
+def _configured_std_stream_max_bytes() -> Optional[int]:
+    """The configured byte limit, or `None` if there is no runtime context."""
     from marimo._runtime.context import ContextNotInitializedError, get_context
 
     try:
         return get_context().marimo_config["runtime"]["std_stream_max_bytes"]
     except ContextNotInitializedError:
-        return 1_000_000
+        return None
+
+
+def std_stream_max_bytes() -> int:
+    max_bytes = _configured_std_stream_max_bytes()
+    if max_bytes is None:
+        return _DEFAULT_STD_STREAM_MAX_BYTES
+    return max_bytes
+
+
+_TRUNCATION_WARNING = (
+    "Warning: marimo truncated a very large console output.\n"
+)
+_TRUNCATION_SUFFIX = " ... "
+
+
+def _truncate_to_max_bytes(data: str, max_bytes: int) -> Optional[str]:
+    """Truncate `data` so that its UTF-8 encoding fits in `max_bytes`.
+
+    Returns `None` if `data` already fits.
+    """
+    # UTF-8 encodes each code point in one to four bytes, so the length of
+    # the string bounds its encoded size; only encode when the bounds
+    # straddle the limit.
+    length = len(data)
+    if length * 4 <= max_bytes:
+        return None
+    if length <= max_bytes:
+        encoded = data.encode("utf-8", "replace")
+        if len(encoded) <= max_bytes:
+            return None
+    elif data.isascii():
+        return data[:max_bytes]
+    else:
+        # `max_bytes` code points take up at least `max_bytes` bytes, so
+        # slice before encoding rather than encoding all of a huge output
+        encoded = data[:max_bytes].encode("utf-8", "replace")
+    return encoded[:max_bytes].decode("utf-8", "ignore")
+
+
+def _join_lines(sequence: Iterable[str], max_bytes: int) -> Iterator[str]:
+    """Join lines into as few strings as fit in `max_bytes`, in order.
+
+    A line that is too large on its own is yielded by itself.
+    """
+    # UTF-8 uses at most four bytes per code point, so a chunk of this many
+    # code points never exceeds the byte limit.
+    max_chars = max(max_bytes // 4, 1)
+    chunk: list[str] = []
+    size = 0
+    for line in sequence:
+        if chunk and size + len(line) > max_chars:
+            yield "".join(chunk)
+            chunk = []
+            size = 0
+        chunk.append(line)
+        size += len(line)
+    if chunk:
+        yield "".join(chunk)
+
+
+# Maximum number of console messages waiting to be flushed to the frontend
+CONSOLE_MSG_QUEUE_MAXLEN = 10_000
+
+_DROPPED_OUTPUT_WARNING = (
+    "Warning: marimo dropped {} console outputs that were written faster "
+    "than they could be displayed.\n"
+)
 
 
 class PipeProtocol(Protocol):
@@ -92,6 +172,10 @@ class ThreadSafeStream(Stream):
     Does not own the pipe or queue.
     """
 
+    # Console byte limit resolved from the runtime config; cleared by
+    # `invalidate_limits` when the config changes.
+    _std_stream_max_bytes: Optional[int] = None
+
     def __init__(
         self,
         pipe: PipeProtocol,
@@ -100,33 +184,145 @@ class ThreadSafeStream(Stream):
         cell_id: Optional[CellId_t] = None,
     ):
         self.pipe = pipe
+        # multiprocessing connections pickle messages with ForkingPickler,
+        # which is built anew on every send; kernel messages are plain data,
+        # so pickle them directly and send the bytes instead. The receiving
+        # end's recv() unpickles them as usual.
+        self._send_bytes: Optional[Callable[[bytes], None]] = getattr(
+            pipe, "send_bytes", None
+        )
         self.cell_id = cell_id
         self.redirect_console = redirect_console
         # A single stream is shared by the kernel and the code completion
         # worker. The lock should almost always be uncontended.
         self.stream_lock = threading.Lock()
+        # Cleared when the pipe fails, after which writes are dropped
+        self._pipe_alive = True
 
         if self.redirect_console:
             # Console outputs are buffered
-            self.console_msg_cv = threading.Condition(threading.Lock())
-            self.console_msg_queue: deque[ConsoleMsg | None] = deque()
+            # Set by producers after appending to the queue (deque appends
+            # are atomic); see `enqueue_console_msg`
+            self.console_msg_event = threading.Event()
+            # Bounded, so that a cell printing faster than outputs can be
+            # flushed can't exhaust the kernel's memory
+            self.console_msg_queue: deque[ConsoleMsg | None] = deque(
+                maxlen=CONSOLE_MSG_QUEUE_MAXLEN
+            )
+            # Number of console messages dropped per cell since the last
+            # drop notice; the lock is only taken when output is dropped
+            # or reported.
+            self._console_msgs_dropped: dict[CellId_t, int] = {}
+            self._console_drop_lock = threading.Lock()
             self.buffered_console_thread = threading.Thread(
                 target=buffered_writer,
-                args=(self.console_msg_queue, self, self.console_msg_cv),
+                args=(self.console_msg_queue, self, self.console_msg_event),
             )
             self.buffered_console_thread.start()
 
         # stdin messages are pulled from this queue
+        #
+        # This is usually a multiprocessing queue fed by the server process,
+        # so it can't be swapped for an in-process deque + Event; one get()
+        # per line of user input is negligible next to waiting on the user.
         self.input_queue = input_queue
 
     def write(self, op: str, data: dict[Any, Any]) -> None:
+        if not self._pipe_alive:
+            return
+        message: Any = (op, data)
+        send: Callable[[Any], None] = self.pipe.send
+        if self._send_bytes is not None:
+            # Pickled outside the lock
+            message = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+            send = self._send_bytes
         with self.stream_lock:
             try:
-                self.pipe.send((op, data))
-            except OSError as e:
+                send(message)
+            except ConnectionError as e:
                 # Most likely a BrokenPipeError, caused by the
-                # server process shutting down
+                # server process shutting down; the pipe won't recover, so
+                # don't keep sending to it.
+                self._pipe_alive = False
                 LOGGER.debug("Error when writing (op: %s) to pipe: %s", op, e)
+            except OSError as e:
+                # Possibly transient, so only this message is dropped
+                LOGGER.debug("Error when writing (op: %s) to pipe: %s", op, e)
+
+    def get_std_stream_max_bytes(self) -> int:
+        """The maximum size in bytes of a single console output."""
+        max_bytes = self._std_stream_max_bytes
+        if max_bytes is None:
+            max_bytes = _configured_std_stream_max_bytes()
+            if max_bytes is None:
+                # Don't memoize the default; the context may be installed
+                # later.
+                return _DEFAULT_STD_STREAM_MAX_BYTES
+            self._std_stream_max_bytes = max_bytes
+        return max_bytes
+
+    def invalidate_limits(self) -> None:
+        """Forget limits resolved from the runtime config."""
+        self._std_stream_max_bytes = None
+
+    def enqueue_console_msg(self, msg: ConsoleMsg) -> None:
+        """Hand a console message off to the buffered console thread.
+
+        If the console thread has fallen `CONSOLE_MSG_QUEUE_MAXLEN` messages
+        behind, stdout and stderr messages are dropped. A notice reporting
+        how many outputs a cell dropped is enqueued before the next output
+        that fits, or by `flush_console_output`.
+        """
+        queue = self.console_msg_queue
+        if msg.stream is not _STDIN:
+            if (
+                self._console_msgs_dropped
+                and len(queue) < CONSOLE_MSG_QUEUE_MAXLEN - 2
+            ):
+                self._enqueue_drop_notices()
+            # Drop new output well before the deque's maxlen would evict old
+            # output; stdin prompts are never dropped.
+            if len(queue) >= CONSOLE_MSG_QUEUE_MAXLEN - 2:
+                # Output without a cell would be discarded anyway
+                if msg.cell_id is not None:
+                    with self._console_drop_lock:
+                        dropped = self._console_msgs_dropped
+                        dropped[msg.cell_id] = dropped.get(msg.cell_id, 0) + 1
+                return
+        queue.append(msg)
+        self._notify_console_thread()
+
+    def _enqueue_drop_notices(self) -> None:
+        queue = self.console_msg_queue
+        with self._console_drop_lock:
+            dropped = self._console_msgs_dropped
+            while dropped:
+                # Keep the last slot free for the stop sentinel
+                if len(queue) >= CONSOLE_MSG_QUEUE_MAXLEN - 1:
+                    break
+                cell_id, count = dropped.popitem()
+                queue.append(
+                    ConsoleMsg(
+                        _STDERR,
+                        cell_id,
+                        _DROPPED_OUTPUT_WARNING.format(count),
+                        "text/plain",
+                    )
+                )
+        self._notify_console_thread()
+
+    def _notify_console_thread(self) -> None:
+        # Event.set() takes a lock, but is_set() doesn't. The writer clears
+        # the event before it drains the queue, so while the event is set,
+        # anything appended is certain to be drained and a wakeup would be
+        # redundant; under bursts of output, producers skip the lock.
+        if not self.console_msg_event.is_set():
+            self.console_msg_event.set()
+
+    def flush_console_output(self) -> None:
+        """Report console output dropped since the last notice, if any."""
+        if self.redirect_console and self._console_msgs_dropped:
+            self._enqueue_drop_notices()
 
     def stop(self) -> None:
         """Teardown resources created by the stream."""
@@ -134,9 +330,13 @@ class ThreadSafeStream(Stream):
         # We don't join the thread in case its processing outputs still; don't
         # want to block the entire program.
         if self.redirect_console:
+            self.flush_console_output()
             self.console_msg_queue.append(None)
-            with self.console_msg_cv:
-                self.console_msg_cv.notify()
+            self.console_msg_event.set()
+
+
+# Number of bytes to read from a redirected file descriptor per syscall
+_FORWARD_READ_SIZE = 65536
 
 
 def _forward_os_stream(
@@ -151,16 +351,205 @@ def _forward_os_stream(
     # TODO(akshayka): Make this loop bomb-proof, so that exceptions raised are
     # exceptions we actually want to pay attention to; then store the exception
     # and print it to the terminal later (outside an execution context).
+    #
+    # Reads are large so that bulk output takes few syscalls, and land in a
+    # single buffer reused for the thread's lifetime; an incremental decoder
+    # stitches together multi-byte characters split across reads.
+    decoder = _make_decoder()
+    buffer = bytearray(_FORWARD_READ_SIZE)
+    view = memoryview(buffer)
     try:
+        raw = io.FileIO(fd, mode="r", closefd=False)
         while not should_exit.is_set():
-            data = os.read(fd, 1024)
-            if not data:
+            n = raw.readinto(buffer)
+            if not n:
+                _forward_text(standard_stream, decoder.decode(b"", final=True))
                 break
-            standard_stream.write(data.decode())
+            _forward_text(standard_stream, decoder.decode(view[:n]))
     except Exception:
         ...
 
 
+def _make_decoder() -> codecs.IncrementalDecoder:
+    return codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+
+def _forward_text(standard_stream: Stdout | Stderr, text: str) -> None:
+    if text:
+        standard_stream.write(text)
+
+
+class _MultiplexedWatcher:
+    """Forwards the output of all redirected file descriptors.
+
+    A single thread polls the read ends of every watcher's pipe, so that
+    stdout and stderr don't each need a thread of their own. Read ends are
+    only closed by the polling thread while it runs, so a file descriptor is
+    never closed (and its number reused) while it is being read.
+    """
+
+    def __init__(self) -> None:
+        self._poll = select.poll()
+        self._streams: dict[
+            int,
+            tuple[Stdout | Stderr, io.FileIO, codecs.IncrementalDecoder],
+        ] = {}
+        # Read ends that watchers are done with, to be closed by the thread
+        self._to_close: deque[int] = deque()
+        # Guards registration changes against the thread shutting down
+        self._lock = threading.Lock()
+        self._closing = False
+        # Set by the thread once it has exited; read ends are then closed by
+        # `unregister` directly
+        self._closed = False
+        # Written to when registrations change, so that the thread wakes up
+        # and polls the new set of file descriptors
+        self._wake_read_fd, self._wake_write_fd = os.pipe()
+        os.set_blocking(self._wake_write_fd, False)
+        self._poll.register(self._wake_read_fd, select.POLLIN)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def register(self, fd: int, standard_stream: Stdout | Stderr) -> None:
+        """Forward data read from `fd` to `standard_stream`."""
+        with self._lock:
+            if self._closing or self._closed:
+                raise RuntimeError("Multiplexed watcher is closed")
+            self._streams[fd] = (
+                standard_stream,
+                io.FileIO(fd, mode="r", closefd=False),
+                _make_decoder(),
+            )
+            self._poll.register(fd, select.POLLIN)
+            self._wake()
+
+    def unregister(self, fd: int) -> None:
+        """Stop forwarding `fd`, and close it."""
+        with self._lock:
+            if self._closed:
+                os.close(fd)
+                return
+            self._to_close.append(fd)
+            self._wake()
+
+    def close(self) -> None:
+        """Stop the polling thread, closing read ends already unregistered.
+
+        Does not wait for the thread to exit.
+        """
+        with self._lock:
+            if self._closing or self._closed:
+                return
+            self._closing = True
+            self._wake()
+
+    def _wake(self) -> None:
+        try:
+            os.write(self._wake_write_fd, b"\0")
+        except BlockingIOError:
+            # The pipe is full, so the thread has a wake-up pending already
+            pass
+
+    def _remove(self, fd: int) -> None:
+        self._streams.pop(fd, None)
+        try:
+            self._poll.unregister(fd)
+        except KeyError:
+            pass
+
+    def _close_unregistered(self) -> None:
+        while self._to_close:
+            closed_fd = self._to_close.popleft()
+            self._remove(closed_fd)
+            with contextlib.suppress(OSError):
+                os.close(closed_fd)
+
+    def _run(self) -> None:
+        try:
+            self._poll_forever()
+        finally:
+            with self._lock:
+                self._closed = True
+                self._close_unregistered()
+                for fd in list(self._streams):
+                    self._remove(fd)
+                os.close(self._wake_read_fd)
+                os.close(self._wake_write_fd)
+
+    def _poll_forever(self) -> None:
+        buffer = bytearray(_FORWARD_READ_SIZE)
+        view = memoryview(buffer)
+        while True:
+            woken = False
+            for fd, _event in self._poll.poll():
+                if fd == self._wake_read_fd:
+                    woken = True
+                    continue
+
+                entry = self._streams.get(fd)
+                if entry is None:
+                    continue
+                standard_stream, raw, decoder = entry
+                # Like `_forward_os_stream`, silence exceptions; a failing
+                # stream just stops being forwarded.
+                try:
+                    n = raw.readinto(buffer)
+                    if not n:
+                        self._remove(fd)
+                        _forward_text(
+                            standard_stream, decoder.decode(b"", final=True)
+                        )
+                        continue
+                    _forward_text(standard_stream, decoder.decode(view[:n]))
+                except Exception:
+                    self._remove(fd)
+
+            # Handled after reading, so that output written just before a
+            # watcher stopped is still forwarded
+            if woken:
+                # Silenced too, so that a failure here doesn't stop the
+                # other streams from being forwarded
+                try:
+                    os.read(self._wake_read_fd, _FORWARD_READ_SIZE)
+                    self._close_unregistered()
+                except Exception:
+                    ...
+                if self._closing:
+                    return
+
+
+_multiplexed_watcher: Optional[_MultiplexedWatcher] = None
+_multiplexed_watcher_users = 0
+_multiplexed_watcher_lock = threading.Lock()
+
+
+def _acquire_multiplexed_watcher() -> _MultiplexedWatcher:
+    """Get the shared watcher, starting it if no watcher is using it."""
+    global _multiplexed_watcher, _multiplexed_watcher_users
+
+    with _multiplexed_watcher_lock:
+        # Replace a watcher whose thread died; its users keep unregistering
+        # from it, which closes their read ends directly
+        if _multiplexed_watcher is None or _multiplexed_watcher._closed:
+            _multiplexed_watcher = _MultiplexedWatcher()
+        _multiplexed_watcher_users += 1
+        return _multiplexed_watcher
+
+
+def _release_multiplexed_watcher() -> None:
+    """Stop the shared watcher once no watcher is using it anymore."""
+    global _multiplexed_watcher, _multiplexed_watcher_users
+
+    with _multiplexed_watcher_lock:
+        _multiplexed_watcher_users -= 1
+        if (
+            _multiplexed_watcher_users == 0
+            and _multiplexed_watcher is not None
+        ):
+            _multiplexed_watcher.close()
+            _multiplexed_watcher = None
+
+
 class Watcher:
     """Watches and redirects a standard stream."""
 
@@ -169,16 +558,32 @@ class Watcher:
     ) -> None:
         self.standard_stream = standard_stream
         self.fd = self.standard_stream._original_fd
-        self.read_fd, self.write_fd = os.pipe()
         self._should_exit = threading.Event()
-        self.thread = threading.Thread(
-            target=_forward_os_stream,
-            args=(self.standard_stream, self.read_fd, self._should_exit),
-            daemon=True,
-        )
-        self.thread.start()
+        # The pipe is created on the first redirect, so that streams which
+        # are never redirected don't hold a thread. Its read end is either
+        # polled by the shared multiplexed watcher, or read by a thread of
+        # this watcher's own.
+        self.thread: Optional[threading.Thread] = None
+        self._multiplexer: Optional[_MultiplexedWatcher] = None
+
+    def _ensure_started(self) -> None:
+        if self._multiplexer is not None or self.thread is not None:
+            return
+        self.read_fd, self.write_fd = os.pipe()
+        if hasattr(select, "poll"):
+            self._multiplexer = _acquire_multiplexed_watcher()
+            self._multiplexer.register(self.read_fd, self.standard_stream)
+        else:
+            # select.poll isn't available on Windows; use a thread per stream
+            self.thread = threading.Thread(
+                target=_forward_os_stream,
+                args=(self.standard_stream, self.read_fd, self._should_exit),
+                daemon=True,
+            )
+            self.thread.start()
 
     def start(self) -> None:
+        self._ensure_started()
         # Save the file for the standard stream by opening a new file
         # descriptor for it
         self.fd_dup = os.dup(self.fd)
@@ -193,11 +598,19 @@ class Watcher:
         os.dup2(self.fd_dup, self.fd)
         os.close(self.fd_dup)
         self.standard_stream._set_fileno(None)
+        # Report output dropped by the cell that just ran
+        self.standard_stream.flush()
 
     def stop(self) -> None:
-        os.close(self.write_fd)
-        os.close(self.read_fd)
-        self._should_exit.set()
+        if self._multiplexer is not None:
+            os.close(self.write_fd)
+            self._multiplexer.unregister(self.read_fd)
+            self._multiplexer = None
+            _release_multiplexed_watcher()
+        elif self.thread is not None:
+            os.close(self.write_fd)
+            os.close(self.read_fd)
+            self._should_exit.set()
 
 
 # NB: Python doesn't provide a standard out class to inherit from, so
@@ -233,39 +646,32 @@ class ThreadSafeStdout(Stdout):
         return False
 
     def flush(self) -> None:
-        # TODO(akshayka): maybe force the buffered writer to write
-        return
+        self._stream.flush_console_output()
 
     def _write_with_mimetype(
         self, data: str, mimetype: ConsoleMimeType
     ) -> int:
-        assert self._stream.cell_id is not None
         if not isinstance(data, str):
             raise TypeError(
                 f"write() argument must be a str, not {type(data).__name__}"
             )
-        max_bytes = std_stream_max_bytes()
-        if sys.getsizeof(data) > max_bytes:
-            sys.stderr.write(
-                "Warning: marimo truncated a very large console output.\n"
-            )
-            data = data[: int(max_bytes)] + " ... "
-        self._stream.console_msg_queue.append(
-            ConsoleMsg(
-                stream=CellChannel.STDOUT,
-                cell_id=self._stream.cell_id,
-                data=data,
-                mimetype=mimetype,
-            )
+        truncated = _truncate_to_max_bytes(
+            data, self._stream.get_std_stream_max_bytes()
+        )
+        if truncated is not None:
+            sys.stderr.write(_TRUNCATION_WARNING)
+            data = "".join((truncated, _TRUNCATION_SUFFIX))
+        self._stream.enqueue_console_msg(
+            ConsoleMsg(_STDOUT, self._stream.cell_id, data, mimetype)
         )
-        with self._stream.console_msg_cv:
-            self._stream.console_msg_cv.notify()
         return len(data)
 
     # Buffer type not available python < 3.12, hence type ignore
     def writelines(self, sequence: Iterable[str]) -> None:  # type: ignore[override] # noqa: E501
-        for line in sequence:
-            self.write(line)
+        for chunk in _join_lines(
+            sequence, self._stream.get_std_stream_max_bytes()
+        ):
+            self._write_with_mimetype(chunk, mimetype="text/plain")
 
 
 class ThreadSafeStderr(Stderr):
@@ -299,40 +705,32 @@ class ThreadSafeStderr(Stderr):
         return False
 
     def flush(self) -> None:
-        # TODO(akshayka): maybe force the buffered writer to write
-        return
+        self._stream.flush_console_output()
 
     def _write_with_mimetype(
         self, data: str, mimetype: ConsoleMimeType
     ) -> int:
-        assert self._stream.cell_id is not None
         if not isinstance(data, str):
             raise TypeError(
                 f"write() argument must be a str, not {type(data).__name__}"
             )
-        max_bytes = std_stream_max_bytes()
-        if sys.getsizeof(data) > max_bytes:
-            data = (
-                "Warning: marimo truncated a very large console output.\n"
-                + data[: int(max_bytes)]
-                + " ... "
-            )
-
-        with self._stream.console_msg_cv:
-            self._stream.console_msg_queue.append(
-                ConsoleMsg(
-                    stream=CellChannel.STDERR,
-                    cell_id=self._stream.cell_id,
-                    data=data,
-                    mimetype=mimetype,
-                )
+        truncated = _truncate_to_max_bytes(
+            data, self._stream.get_std_stream_max_bytes()
+        )
+        if truncated is not None:
+            data = "".join(
+                (_TRUNCATION_WARNING, truncated, _TRUNCATION_SUFFIX)
             )
-            self._stream.console_msg_cv.notify()
+        self._stream.enqueue_console_msg(
+            ConsoleMsg(_STDERR, self._stream.cell_id, data, mimetype)
+        )
         return len(data)
 
     def writelines(self, sequence: Iterable[str]) -> None:  # type: ignore[override] # noqa: E501
-        for line in sequence:
-            self.write(line)
+        for chunk in _join_lines(
+            sequence, self._stream.get_std_stream_max_bytes()
+        ):
+            self._write_with_mimetype(chunk, mimetype="text/plain")
 
 
 class ThreadSafeStdin(Stdin):
@@ -357,31 +755,25 @@ class ThreadSafeStdin(Stdin):
 
     def _readline_with_prompt(self, prompt: str = "") -> str:
         """Read input from the standard in stream, with an optional prompt."""
+        # Checked eagerly: a prompt without a cell would block forever.
         assert self._stream.cell_id is not None
         if not isinstance(prompt, str):
             raise TypeError(
                 f"prompt must be a str, not {type(prompt).__name__}"
             )
 
-        max_bytes = std_stream_max_bytes()
-        if sys.getsizeof(prompt) > max_bytes:
-            prompt = (
-                "Warning: marimo truncated a very large console output.\n"
-                + prompt[: int(max_bytes)]
-                + " ... "
+        truncated = _truncate_to_max_bytes(
+            prompt, self._stream.get_std_stream_max_bytes()
+        )
+        if truncated is not None:
+            prompt = "".join(
+                (_TRUNCATION_WARNING, truncated, _TRUNCATION_SUFFIX)
             )
 
-        with self._stream.console_msg_cv:
-            # This sends a prompt request to the frontend.
-            self._stream.console_msg_queue.append(
-                ConsoleMsg(
-                    stream=CellChannel.STDIN,
-                    cell_id=self._stream.cell_id,
-                    data=prompt,
-                    mimetype="text/plain",
-                )
-            )
-            self._stream.console_msg_cv.notify()
+        # This sends a prompt request to the frontend.
+        self._stream.enqueue_console_msg(
+            ConsoleMsg(_STDIN, self._stream.cell_id, prompt, "text/plain")
+        )
 
         return self._stream.input_queue.get()
 
@@ -397,20 +789,19 @@ class ThreadSafeStdin(Stdin):
         # hint only included for compatibility with sys.stdin.readlines API;
         # we don't support it.
         del hint
-        return self._readline_with_prompt(prompt="").split("\n")
+        result = self._readline_with_prompt(prompt="")
+        return result.split("\n") if "\n" in result else [result]
 
 
 @contextlib.contextmanager
 def redirect(standard_stream: Stdout | Stderr) -> Iterator[None]:
     """Redirect a standard stream to the frontend."""
+    # Only ThreadSafeStdout and ThreadSafeStderr have a watcher
+    watcher: Optional[Watcher] = getattr(standard_stream, "_watcher", None)
     try:
-        if isinstance(standard_stream, ThreadSafeStdout) or isinstance(
-            standard_stream, ThreadSafeStderr
-        ):
-            standard_stream._watcher.start()
+        if watcher is not None:
+            watcher.start()
         yield
     finally:
-        if isinstance(standard_stream, ThreadSafeStdout) or isinstance(
-            standard_stream, ThreadSafeStderr
-        ):
-            standard_stream._watcher.pause()
+        if watcher is not None:
+            watcher.pause()
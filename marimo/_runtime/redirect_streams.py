@@ -65,6 +65,8 @@ def redirect_streams(
             ...
         return
 
+    # Checked once here rather than on every write to stdout/stderr
+    assert cell_id is not None
     stream.cell_id = cell_id
     if stdout is None or stderr is None:
         try:
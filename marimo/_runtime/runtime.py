@@ -669,6 +669,8 @@ class Kernel:
         autoreload_mode = config["runtime"]["auto_reload"]
         self.reactive_execution_mode = config["runtime"]["on_cell_change"]
         self.user_config = config
+        if isinstance(self.stream, ThreadSafeStream):
+            self.stream.invalidate_limits()
 
         self.packages_callbacks.update_package_manager(package_manager)
 
@@ -126,6 +126,20 @@ class TestConsoleOutputWorker:
         assert outputs_buffered_per_cell["cell1"][0].data == "Hello"
         assert outputs_buffered_per_cell["cell1"][1].data == "Error"
 
+    def test_add_output_to_buffer_without_cell(self) -> None:
+        # Output written outside of a cell is discarded
+        outputs_buffered_per_cell = {}
+        msg = ConsoleMsg(
+            stream=CellChannel.STDOUT,
+            cell_id=None,
+            data="Hello",
+            mimetype="text/plain",
+        )
+
+        _add_output_to_buffer(msg, outputs_buffered_per_cell)
+
+        assert outputs_buffered_per_cell == {}
+
     def test_write_console_output(self) -> None:
         # Test writing console output to stream
         stream = MockStream()
@@ -148,27 +162,26 @@ class TestConsoleOutputWorker:
         # Test basic functionality of buffered writer
         stream = MockStream()
         msg_queue: deque[Optional[ConsoleMsg]] = deque()
-        cv = threading.Condition()
+        event = threading.Event()
 
         # Start the buffered writer in a separate thread
         thread = threading.Thread(
-            target=buffered_writer, args=(msg_queue, stream, cv)
+            target=buffered_writer, args=(msg_queue, stream, event)
         )
         thread.daemon = True
         thread.start()
 
         try:
             # Add a message to the queue
-            with cv:
-                msg_queue.append(
-                    ConsoleMsg(
-                        stream=CellChannel.STDOUT,
-                        cell_id="cell1",
-                        data="Hello",
-                        mimetype="text/plain",
-                    )
+            msg_queue.append(
+                ConsoleMsg(
+                    stream=CellChannel.STDOUT,
+                    cell_id="cell1",
+                    data="Hello",
+                    mimetype="text/plain",
                 )
-                cv.notify()
+            )
+            event.set()
 
             # Wait for the timeout to expire and the message to be written
             # Use a longer timeout to ensure the message is processed
@@ -185,52 +198,50 @@ class TestConsoleOutputWorker:
 
         finally:
             # Signal the writer to terminate
-            with cv:
-                msg_queue.append(None)
-                cv.notify()
+            msg_queue.append(None)
+            event.set()
             thread.join(timeout=1.0)
 
     def test_buffered_writer_multiple_messages(self) -> None:
         # Test buffered writer with multiple messages
         stream = MockStream()
         msg_queue: deque[Optional[ConsoleMsg]] = deque()
-        cv = threading.Condition()
+        event = threading.Event()
 
         # Start the buffered writer in a separate thread
         thread = threading.Thread(
-            target=buffered_writer, args=(msg_queue, stream, cv)
+            target=buffered_writer, args=(msg_queue, stream, event)
         )
         thread.daemon = True
         thread.start()
 
         try:
             # Add multiple messages to the queue
-            with cv:
-                msg_queue.append(
-                    ConsoleMsg(
-                        stream=CellChannel.STDOUT,
-                        cell_id="cell1",
-                        data="Hello",
-                        mimetype="text/plain",
-                    )
+            msg_queue.append(
+                ConsoleMsg(
+                    stream=CellChannel.STDOUT,
+                    cell_id="cell1",
+                    data="Hello",
+                    mimetype="text/plain",
                 )
-                msg_queue.append(
-                    ConsoleMsg(
-                        stream=CellChannel.STDOUT,
-                        cell_id="cell1",
-                        data=" World",
-                        mimetype="text/plain",
-                    )
+            )
+            msg_queue.append(
+                ConsoleMsg(
+                    stream=CellChannel.STDOUT,
+                    cell_id="cell1",
+                    data=" World",
+                    mimetype="text/plain",
                 )
-                msg_queue.append(
-                    ConsoleMsg(
-                        stream=CellChannel.STDERR,
-                        cell_id="cell1",
-                        data="Error",
-                        mimetype="text/plain",
-                    )
+            )
+            msg_queue.append(
+                ConsoleMsg(
+                    stream=CellChannel.STDERR,
+                    cell_id="cell1",
+                    data="Error",
+                    mimetype="text/plain",
                 )
-                cv.notify()
+            )
+            event.set()
 
             # Wait for the timeout to expire and the messages to be written
             # Use a longer timeout to ensure the messages are processed
@@ -254,7 +265,6 @@ class TestConsoleOutputWorker:
 
         finally:
             # Signal the writer to terminate
-            with cv:
-                msg_queue.append(None)
-                cv.notify()
+            msg_queue.append(None)
+            event.set()
             thread.join(timeout=1.0)
@@ -1,5 +1,33 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+import multiprocessing
+import os
+import queue
+import select
 import sys
+import threading
+import time
+from typing import Any
+
+import pytest
 
+from marimo._config.config import DEFAULT_CONFIG
+from marimo._messaging.cell_output import CellChannel
+from marimo._messaging.console_output_worker import ConsoleMsg
+from marimo._messaging.streams import (
+    CONSOLE_MSG_QUEUE_MAXLEN,
+    ThreadSafeStderr,
+    ThreadSafeStdout,
+    ThreadSafeStream,
+    _forward_os_stream,
+    _join_lines,
+    _MultiplexedWatcher,
+    _truncate_to_max_bytes,
+    redirect,
+)
+from marimo._runtime.requests import SetUserConfigRequest
 from marimo._runtime.runtime import Kernel
 from tests.conftest import ExecReqProvider, MockedKernel
 
@@ -76,7 +104,39 @@ class TestStdout:
                 )
             ]
         )
-        assert mocked_kernel.stdout.messages == ["hello", "there"]
+        assert mocked_kernel.stdout.messages == ["hellothere"]
+
+    @staticmethod
+    async def test_fd_write_forwarded(
+        mocked_kernel: MockedKernel, exec_req: ExecReqProvider
+    ) -> None:
+        # The watched fd is whatever sys.stdout was backed by at startup,
+        # which isn't 1 under pytest's capturing
+        fd = mocked_kernel.stdout._original_fd
+        await mocked_kernel.k.run(
+            [exec_req.get(f"import os; os.write({fd}, b'from fd')")]
+        )
+        for _ in range(50):
+            if mocked_kernel.stdout.messages:
+                break
+            await asyncio.sleep(0.01)
+        assert mocked_kernel.stdout.messages == ["from fd"]
+
+    @staticmethod
+    def test_watcher_started_on_first_redirect(
+        mocked_kernel: MockedKernel,
+    ) -> None:
+        watcher = mocked_kernel.stdout._watcher
+        assert watcher.thread is None
+        assert watcher._multiplexer is None
+        with redirect(mocked_kernel.stdout):
+            thread = (
+                watcher.thread
+                if watcher._multiplexer is None
+                else watcher._multiplexer.thread
+            )
+            assert thread is not None
+            assert thread.is_alive()
 
 
 class TestStderr:
@@ -109,7 +169,7 @@ class TestStderr:
                 )
             ]
         )
-        assert mocked_kernel.stderr.messages == ["hello", "there"]
+        assert mocked_kernel.stderr.messages == ["hellothere"]
 
 
 async def test_import_multiprocessing(
@@ -128,3 +188,448 @@ async def test_import_multiprocessing(
         ]
     )
     assert mocked_kernel.stdout.messages == ["hello", "\n"]
+
+
+class _ListPipe:
+    def __init__(self) -> None:
+        self.messages: list[Any] = []
+
+    def send(self, obj: Any) -> None:
+        self.messages.append(obj)
+
+
+def _wait_for_messages(pipe: _ListPipe, n: int = 1) -> None:
+    for _ in range(50):
+        if len(pipe.messages) >= n:
+            break
+        time.sleep(0.01)
+
+
+class TestConsoleOutput:
+    @staticmethod
+    def _make_stream() -> tuple[ThreadSafeStream, list[ConsoleMsg]]:
+        stream = ThreadSafeStream(
+            pipe=_ListPipe(),
+            input_queue=queue.Queue(),
+            redirect_console=True,
+            cell_id="cell1",
+        )
+        enqueued: list[ConsoleMsg] = []
+        stream.enqueue_console_msg = enqueued.append  # type: ignore
+        return stream, enqueued
+
+    @staticmethod
+    def _make_piped_stdout() -> tuple[ThreadSafeStdout, _ListPipe]:
+        pipe = _ListPipe()
+        stream = ThreadSafeStream(
+            pipe=pipe,
+            input_queue=queue.Queue(),
+            redirect_console=True,
+            cell_id="cell1",
+        )
+        return ThreadSafeStdout(stream), pipe
+
+    @staticmethod
+    def test_output_reaches_pipe() -> None:
+        stdout, pipe = TestConsoleOutput._make_piped_stdout()
+        try:
+            stdout.write("hello")
+            stdout.write("\n")
+            _wait_for_messages(pipe)
+            # Consecutive writes are merged by the console thread
+            assert len(pipe.messages) == 1
+            op, data = pipe.messages[0]
+            assert op == "cell-op"
+            assert data["console"]["data"] == "hello\n"
+        finally:
+            stdout.stop()
+            stdout._stream.stop()
+
+    @staticmethod
+    def test_partial_line_delivered() -> None:
+        stdout, pipe = TestConsoleOutput._make_piped_stdout()
+        try:
+            # e.g. print("Loading...", end="") before a long computation;
+            # no further write follows
+            stdout.write("Loading...")
+            _wait_for_messages(pipe)
+            assert [m[1]["console"]["data"] for m in pipe.messages] == [
+                "Loading..."
+            ]
+        finally:
+            stdout.stop()
+            stdout._stream.stop()
+
+    @staticmethod
+    def test_partial_line_from_thread_delivered() -> None:
+        stdout, pipe = TestConsoleOutput._make_piped_stdout()
+        try:
+            thread = threading.Thread(target=stdout.write, args=("partial",))
+            thread.start()
+            thread.join()
+            _wait_for_messages(pipe)
+            assert [m[1]["console"]["data"] for m in pipe.messages] == [
+                "partial"
+            ]
+        finally:
+            stdout.stop()
+            stdout._stream.stop()
+
+    @staticmethod
+    def test_fd_output_reaches_pipe() -> None:
+        stdout, pipe = TestConsoleOutput._make_piped_stdout()
+        try:
+            with redirect(stdout):
+                os.write(stdout._original_fd, b"from fd")
+                # Wait while the cell is still running; output read after
+                # its cell_id is reset is discarded
+                _wait_for_messages(pipe)
+            assert len(pipe.messages) == 1
+            _op, data = pipe.messages[0]
+            assert data["cell_id"] == "cell1"
+            assert data["console"]["data"] == "from fd"
+        finally:
+            stdout.stop()
+            stdout._stream.stop()
+
+
+def _make_stopped_stream() -> ThreadSafeStream:
+    stream = ThreadSafeStream(
+        pipe=_ListPipe(),
+        input_queue=queue.Queue(),
+        redirect_console=True,
+        cell_id="cell1",
+    )
+    # Stop the console thread so the queue isn't drained under the test
+    stream.stop()
+    stream.buffered_console_thread.join(timeout=1.0)
+    stream.console_msg_queue.clear()
+    return stream
+
+
+def _console_msg(channel: CellChannel, cell_id: str = "cell1") -> ConsoleMsg:
+    return ConsoleMsg(channel, cell_id, "x", "text/plain")
+
+
+def _fill_console_queue(stream: ThreadSafeStream, extra: int) -> None:
+    for _ in range(CONSOLE_MSG_QUEUE_MAXLEN - 2 + extra):
+        stream.enqueue_console_msg(_console_msg(CellChannel.STDOUT))
+
+
+def test_console_queue_drops_when_full() -> None:
+    stream = _make_stopped_stream()
+    msg_queue = stream.console_msg_queue
+    _fill_console_queue(stream, extra=12)
+    assert len(msg_queue) == CONSOLE_MSG_QUEUE_MAXLEN - 2
+
+    # Prompts are never dropped
+    stream.enqueue_console_msg(_console_msg(CellChannel.STDIN))
+    assert msg_queue[-1].stream == CellChannel.STDIN  # type: ignore
+
+    # Once there's room, a single notice precedes the next output, and is
+    # attributed to the cell whose output was dropped
+    for _ in range(10):
+        msg_queue.popleft()
+    stream.enqueue_console_msg(_console_msg(CellChannel.STDOUT, "cell2"))
+    notice, last = msg_queue[-2], msg_queue[-1]
+    assert notice is not None
+    assert last is not None
+    assert notice.stream == CellChannel.STDERR
+    assert notice.cell_id == "cell1"
+    assert "dropped 12 console outputs" in notice.data
+    assert last.cell_id == "cell2"
+
+
+def test_console_queue_drops_reported_on_flush() -> None:
+    stream = _make_stopped_stream()
+    msg_queue = stream.console_msg_queue
+    # The burst is the cell's last output; the writer hasn't caught up
+    _fill_console_queue(stream, extra=5)
+    stream.flush_console_output()
+    notice = msg_queue[-1]
+    assert notice is not None
+    assert notice.stream == CellChannel.STDERR
+    assert notice.cell_id == "cell1"
+    assert "dropped 5 console outputs" in notice.data
+    # Room is left for the stop sentinel
+    assert len(msg_queue) < CONSOLE_MSG_QUEUE_MAXLEN
+
+    # Reported only once
+    stream.flush_console_output()
+    assert msg_queue[-1] is notice
+
+
+def test_write_to_connection() -> None:
+    read_conn, write_conn = multiprocessing.Pipe(duplex=False)
+    stream = ThreadSafeStream(
+        pipe=write_conn, input_queue=queue.Queue(), redirect_console=False
+    )
+    try:
+        stream.write("op", {"key": ["value", 1]})
+        assert read_conn.recv() == ("op", {"key": ["value", 1]})
+    finally:
+        read_conn.close()
+        write_conn.close()
+
+
+def test_write_stops_after_broken_pipe() -> None:
+    class _BrokenPipe:
+        def __init__(self) -> None:
+            self.calls = 0
+
+        def send(self, obj: Any) -> None:
+            del obj
+            self.calls += 1
+            raise BrokenPipeError
+
+    pipe = _BrokenPipe()
+    stream = ThreadSafeStream(
+        pipe=pipe, input_queue=queue.Queue(), redirect_console=False
+    )
+    stream.write("op", {})
+    stream.write("op", {})
+    assert pipe.calls == 1
+
+
+def test_write_continues_after_transient_error() -> None:
+    class _FlakyPipe:
+        def __init__(self) -> None:
+            self.messages: list[Any] = []
+            self.calls = 0
+
+        def send(self, obj: Any) -> None:
+            self.calls += 1
+            if self.calls == 1:
+                raise BlockingIOError
+            self.messages.append(obj)
+
+    pipe = _FlakyPipe()
+    stream = ThreadSafeStream(
+        pipe=pipe, input_queue=queue.Queue(), redirect_console=False
+    )
+    stream.write("op", {"n": 1})
+    stream.write("op", {"n": 2})
+    assert pipe.messages == [("op", {"n": 2})]
+
+
+def test_stderr_truncates_large_output() -> None:
+    stream, enqueued = TestConsoleOutput._make_stream()
+    stream._std_stream_max_bytes = 10
+    stderr = ThreadSafeStderr(stream)
+    try:
+        stderr.write("x" * 20)
+        stderr.flush()
+        assert [m.data for m in enqueued] == [
+            "Warning: marimo truncated a very large console output.\n"
+            + "x" * 10
+            + " ... "
+        ]
+    finally:
+        stderr.stop()
+        stream.stop()
+
+
+def test_truncate_to_max_bytes() -> None:
+    # Output that fits isn't truncated
+    assert _truncate_to_max_bytes("", 0) is None
+    assert _truncate_to_max_bytes("abc", 3) is None
+    assert _truncate_to_max_bytes("abcdef", 3) == "abc"
+    # "é" is two bytes in UTF-8
+    assert _truncate_to_max_bytes("éé", 4) is None
+    # Multi-byte characters are never split
+    assert _truncate_to_max_bytes("ééé", 5) == "éé"
+    assert _truncate_to_max_bytes("a" + "é" * 10, 6) == "aéé"
+
+
+def test_std_stream_max_bytes_follows_config(
+    mocked_kernel: MockedKernel,
+) -> None:
+    stream = mocked_kernel.stream
+    assert (
+        stream.get_std_stream_max_bytes()
+        == DEFAULT_CONFIG["runtime"]["std_stream_max_bytes"]
+    )
+
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    config["runtime"]["std_stream_max_bytes"] = 10
+    mocked_kernel.k.set_user_config(SetUserConfigRequest(config=config))
+    assert stream.get_std_stream_max_bytes() == 10
+
+
+def test_join_lines() -> None:
+    assert list(_join_lines([], 100)) == []
+    assert list(_join_lines(["a", "b", "c"], 100)) == ["abc"]
+    # At most max_bytes // 4 code points per chunk
+    assert list(_join_lines(["aa", "bb", "cc"], 16)) == ["aabb", "cc"]
+    # Oversized lines are passed through on their own
+    assert list(_join_lines(["a", "b" * 10, "c"], 8)) == ["a", "b" * 10, "c"]
+    # Generators are consumed lazily
+    assert list(_join_lines((c for c in "abc"), 100)) == ["abc"]
+
+
+class _RecordingStdout:
+    def __init__(self) -> None:
+        self.data: list[str] = []
+
+    def write(self, data: str) -> int:
+        self.data.append(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+
+def _forward(chunks: list[bytes]) -> str:
+    standard_stream = _RecordingStdout()
+    read_fd, write_fd = os.pipe()
+    thread = threading.Thread(
+        target=_forward_os_stream,
+        args=(standard_stream, read_fd, threading.Event()),
+        daemon=True,
+    )
+    thread.start()
+    try:
+        for chunk in chunks:
+            written = len(standard_stream.data)
+            os.write(write_fd, chunk)
+            # Wait for the chunk to be forwarded, so that the next one is
+            # read separately; each chunk decodes to some text
+            for _ in range(100):
+                if len(standard_stream.data) > written:
+                    break
+                time.sleep(0.01)
+            assert len(standard_stream.data) > written
+    finally:
+        os.close(write_fd)
+        thread.join(timeout=1.0)
+        os.close(read_fd)
+    assert not thread.is_alive()
+    return "".join(standard_stream.data)
+
+
+def test_forward_os_stream_split_multibyte() -> None:
+    encoded = "héllo wörld".encode()
+    # Split in the middle of "é"
+    assert _forward([encoded[:2], encoded[2:]]) == "héllo wörld"
+
+
+def test_forward_os_stream_invalid_utf8() -> None:
+    # Invalid bytes are replaced rather than dropping the rest of the stream
+    assert _forward([b"ok \xff", b" still here"]) == "ok \ufffd still here"
+    # A truncated sequence at EOF is flushed as a replacement character
+    assert _forward([b"end \xc3"]) == "end \ufffd"
+
+
+@pytest.mark.skipif(not hasattr(select, "poll"), reason="requires poll")
+def test_multiplexed_watcher_forwards_each_fd() -> None:
+    watcher = _MultiplexedWatcher()
+    try:
+        _check_forwards_each_fd(watcher)
+    finally:
+        watcher.close()
+        watcher.thread.join(timeout=1.0)
+    assert not watcher.thread.is_alive()
+    assert watcher._closed
+
+
+@pytest.mark.skipif(not hasattr(select, "poll"), reason="requires poll")
+@pytest.mark.filterwarnings(
+    "ignore::pytest.PytestUnhandledThreadExceptionWarning"
+)
+def test_multiplexed_watcher_refuses_register_after_thread_dies(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    def crash(_self: _MultiplexedWatcher) -> None:
+        raise RuntimeError("crashed")
+
+    monkeypatch.setattr(_MultiplexedWatcher, "_poll_forever", crash)
+    watcher = _MultiplexedWatcher()
+    watcher.thread.join(timeout=1.0)
+    assert watcher._closed
+    assert not watcher._closing
+
+    # The wake pipe is closed, so neither may write to it
+    read_fd, write_fd = os.pipe()
+    try:
+        with pytest.raises(RuntimeError):
+            watcher.register(read_fd, _RecordingStdout())  # type: ignore[arg-type]
+        watcher.close()
+        assert not watcher._closing
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+
+@pytest.mark.skipif(not hasattr(select, "poll"), reason="requires poll")
+def test_multiplexed_watcher_replaced_after_thread_dies(
+    mocked_kernel: MockedKernel, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    stdout, stderr = mocked_kernel.stdout, mocked_kernel.stderr
+    with redirect(stdout):
+        dead = stdout._watcher._multiplexer
+        assert dead is not None
+        dead.close()
+        dead.thread.join(timeout=1.0)
+        # Simulate the thread having died rather than being closed
+        monkeypatch.setattr(dead, "_closing", False)
+        with redirect(stderr):
+            multiplexer = stderr._watcher._multiplexer
+            assert multiplexer is not None
+            assert multiplexer is not dead
+            assert multiplexer.thread.is_alive()
+    stdout._watcher.stop()
+    stderr._watcher.stop()
+    multiplexer.thread.join(timeout=1.0)
+    assert not multiplexer.thread.is_alive()
+
+
+def _check_forwards_each_fd(watcher: _MultiplexedWatcher) -> None:
+    stdout, stderr = _RecordingStdout(), _RecordingStdout()
+    stdout_read, stdout_write = os.pipe()
+    stderr_read, stderr_write = os.pipe()
+    watcher.register(stdout_read, stdout)  # type: ignore[arg-type]
+    watcher.register(stderr_read, stderr)  # type: ignore[arg-type]
+
+    encoded = "héllo".encode()
+    os.write(stdout_write, encoded[:2])
+    os.write(stderr_write, b"error")
+    # Wait for "h" so that the rest of "é" is read separately
+    for _ in range(100):
+        if stdout.data:
+            break
+        time.sleep(0.01)
+    assert stdout.data == ["h"]
+    os.write(stdout_write, encoded[2:])
+    os.close(stdout_write)
+    os.close(stderr_write)
+    watcher.unregister(stdout_read)
+    watcher.unregister(stderr_read)
+
+    for _ in range(50):
+        if "".join(stdout.data) == "héllo" and "".join(stderr.data):
+            break
+        time.sleep(0.01)
+    assert "".join(stdout.data) == "héllo"
+    assert "".join(stderr.data) == "error"
+    for _ in range(50):
+        if not watcher._streams:
+            break
+        time.sleep(0.01)
+    assert watcher._streams == {}
+
+
+@pytest.mark.skipif(not hasattr(select, "poll"), reason="requires poll")
+def test_multiplexed_watcher_stops_with_last_watcher(
+    mocked_kernel: MockedKernel,
+) -> None:
+    stdout, stderr = mocked_kernel.stdout, mocked_kernel.stderr
+    with redirect(stdout), redirect(stderr):
+        multiplexer = stdout._watcher._multiplexer
+        assert multiplexer is not None
+        assert stderr._watcher._multiplexer is multiplexer
+    stdout._watcher.stop()
+    assert multiplexer.thread.is_alive()
+    stderr._watcher.stop()
+    multiplexer.thread.join(timeout=1.0)
+    assert not multiplexer.thread.is_alive()
+    assert multiplexer._closed